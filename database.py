@@ -1,18 +1,107 @@
 import sqlite3
+import queue
+import numpy as np
 import pandas as pd
 import os
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+DB_PATH = 'database/taiwan_stock.db'
+
+# price_daily.date 存的是 1970-01-01 起算的天數
+_EPOCH = date(1970, 1, 1)
+
+# select_price 回傳的欄位與型別；日期的天數直接以 datetime64[D] 解讀，不需再解析
+_PRICE_DTYPE = [
+    ('date', 'M8[D]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'i8'),
+    ('dividends', 'f8'),
+    ('stock_splits', 'f8'),
+]
+
+INSERT_PRICE_SQL = """
+INSERT INTO price_daily (
+    date, open, high, low, close, volume, dividends, stock_splits, ticker
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(ticker, date)
+DO UPDATE SET
+    open = excluded.open,
+    high = excluded.high,
+    low = excluded.low,
+    close = excluded.close,
+    volume = excluded.volume,
+    dividends = excluded.dividends,
+    stock_splits = excluded.stock_splits
+-- 內容完全相同時不改寫，避免無意義的頁面寫入與觸發器
+WHERE price_daily.open IS NOT excluded.open
+   OR price_daily.high IS NOT excluded.high
+   OR price_daily.low IS NOT excluded.low
+   OR price_daily.close IS NOT excluded.close
+   OR price_daily.volume IS NOT excluded.volume
+   OR price_daily.dividends IS NOT excluded.dividends
+   OR price_daily.stock_splits IS NOT excluded.stock_splits;
+"""
+
+# 每條連線快取的已編譯 SQL 數量（預設 128）
+_CACHED_STATEMENTS = 256
+
+# 每條連線都要套用的設定：WAL 讓讀寫可同時進行，synchronous=NORMAL 減少 fsync
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-131072",
+)
+
+# 連線池：重複使用連線，保留 SQLite 的頁面快取
+_pool = queue.Queue(maxsize=8)
+
+# numpy 整數不是 int 的子類別，未註冊時 sqlite3 會把它當成 BLOB 寫入
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+
+
+def _apply_pragmas(conn):
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+
+
+def _new_pool_conn():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=_CACHED_STATEMENTS)
+    _apply_pragmas(conn)
+    return conn
+
+
+@contextmanager
+def get_conn():
+    """從連線池取出連線，用完自動歸還（池滿時直接關閉）"""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _new_pool_conn()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
 
 
-def create_table():
-    """建立資料庫表格"""
-    os.makedirs('./database', exist_ok=True)
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-
+def _create_price_daily(cursor):
+    # 以 (ticker, date) 為主鍵的 WITHOUT ROWID 表：資料直接依主鍵排序存放，
+    # 寫入只需維護一棵 B-tree，依股票查詢也是單純的範圍掃描
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS price_daily (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT,
+            date INTEGER,
             open REAL,
             high REAL,
             low REAL,
@@ -21,318 +110,466 @@ def create_table():
             dividends REAL,
             stock_splits REAL,
             ticker TEXT,
-            UNIQUE (ticker, date)
-        )
+            PRIMARY KEY (ticker, date)
+        ) WITHOUT ROWID
     ''')
 
+
+def _migrate_price_daily(cursor):
+    """
+    舊版 price_daily 有 id AUTOINCREMENT 欄位、日期存成 'YYYY-MM-DD' 文字，
+    搬移到新的表格結構並把日期轉成天數；有搬移時回傳 True
+    若留有上次中斷的 price_daily_old，從它繼續搬移
+    """
+    leftover = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price_daily_old'"
+    ).fetchone()
+    columns = {row[1]: row[2] for row in cursor.execute("PRAGMA table_info(price_daily)")}
+    if columns.get('date') == 'INTEGER' and not leftover:
+        return False
+
+    print("🔄 正在轉換 price_daily 表格結構...")
+    if not leftover:
+        cursor.execute("ALTER TABLE price_daily RENAME TO price_daily_old")
+    _create_price_daily(cursor)
+    cursor.execute("""
+        INSERT OR IGNORE INTO price_daily (
+            date, open, high, low, close, volume, dividends, stock_splits, ticker
+        )
+        SELECT CAST(julianday(date) - julianday('1970-01-01') AS INTEGER),
+               open, high, low, close, volume, dividends, stock_splits, ticker
+        FROM price_daily_old
+    """)
+    cursor.execute("DROP TABLE price_daily_old")
+    return True
+
+
+def _create_ticker_stats(cursor, rebuild=False):
+    """
+    ticker_stats 是每支股票的統計摘要，由 price_daily 上的觸發器即時維護，
+    get_ticker_statistics 只需查一列
+    rebuild: price_daily 剛搬移過時重新計算全部統計
+    """
+    stats_columns = [row[1] for row in cursor.execute("PRAGMA table_info(ticker_stats)")]
+    if stats_columns and 'close_count' not in stats_columns:
+        # 舊版沒有 close_count，連同觸發器重建
+        cursor.execute("DROP TRIGGER IF EXISTS trg_price_daily_insert")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_price_daily_update")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_price_daily_delete")
+        cursor.execute("DROP TABLE ticker_stats")
+        stats_columns = []
+    existed = bool(stats_columns)
+
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
+        CREATE TABLE IF NOT EXISTS ticker_stats (
+            ticker TEXT PRIMARY KEY,
+            total_days INTEGER,
+            first_date INTEGER,
+            last_date INTEGER,
+            lowest_price REAL,
+            highest_price REAL,
+            sum_close REAL,
+            close_count INTEGER,
+            total_volume INTEGER
         )
     ''')
 
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ticker_categories (
-            ticker TEXT,
-            category_id INTEGER,
-            PRIMARY KEY (ticker, category_id),
-            FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
-        )
+        CREATE TRIGGER IF NOT EXISTS trg_price_daily_insert
+        AFTER INSERT ON price_daily
+        BEGIN
+            INSERT INTO ticker_stats (
+                ticker, total_days, first_date, last_date,
+                lowest_price, highest_price, sum_close, close_count, total_volume
+            )
+            VALUES (NEW.ticker, 1, NEW.date, NEW.date,
+                    NEW.low, NEW.high, COALESCE(NEW.close, 0), NEW.close IS NOT NULL,
+                    COALESCE(NEW.volume, 0))
+            ON CONFLICT(ticker) DO UPDATE SET
+                total_days = total_days + 1,
+                first_date = MIN(first_date, excluded.first_date),
+                last_date = MAX(last_date, excluded.last_date),
+                lowest_price = MIN(COALESCE(lowest_price, excluded.lowest_price),
+                                   COALESCE(excluded.lowest_price, lowest_price)),
+                highest_price = MAX(COALESCE(highest_price, excluded.highest_price),
+                                    COALESCE(excluded.highest_price, highest_price)),
+                sum_close = sum_close + excluded.sum_close,
+                close_count = close_count + excluded.close_count,
+                total_volume = total_volume + excluded.total_volume;
+        END
     ''')
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("✅ 資料庫初始化完成")
+    # upsert 遇到既有日期時走 UPDATE；最低/最高價只有在舊值剛好是極值時才重新計算
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_price_daily_update
+        AFTER UPDATE ON price_daily
+        BEGIN
+            UPDATE ticker_stats SET
+                sum_close = sum_close - COALESCE(OLD.close, 0) + COALESCE(NEW.close, 0),
+                close_count = close_count - (OLD.close IS NOT NULL) + (NEW.close IS NOT NULL),
+                total_volume = total_volume - COALESCE(OLD.volume, 0) + COALESCE(NEW.volume, 0),
+                lowest_price = CASE
+                    WHEN NEW.low <= lowest_price THEN NEW.low
+                    WHEN OLD.low > lowest_price THEN lowest_price
+                    ELSE (SELECT MIN(low) FROM price_daily WHERE ticker = NEW.ticker)
+                END,
+                highest_price = CASE
+                    WHEN NEW.high >= highest_price THEN NEW.high
+                    WHEN OLD.high < highest_price THEN highest_price
+                    ELSE (SELECT MAX(high) FROM price_daily WHERE ticker = NEW.ticker)
+                END
+            WHERE ticker = NEW.ticker;
+        END
+    ''')
 
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_price_daily_delete
+        AFTER DELETE ON price_daily
+        BEGIN
+            UPDATE ticker_stats SET
+                total_days = total_days - 1,
+                sum_close = sum_close - COALESCE(OLD.close, 0),
+                close_count = close_count - (OLD.close IS NOT NULL),
+                total_volume = total_volume - COALESCE(OLD.volume, 0),
+                first_date = CASE
+                    WHEN OLD.date > first_date THEN first_date
+                    ELSE (SELECT MIN(date) FROM price_daily WHERE ticker = OLD.ticker)
+                END,
+                last_date = CASE
+                    WHEN OLD.date < last_date THEN last_date
+                    ELSE (SELECT MAX(date) FROM price_daily WHERE ticker = OLD.ticker)
+                END,
+                lowest_price = CASE
+                    WHEN OLD.low > lowest_price THEN lowest_price
+                    ELSE (SELECT MIN(low) FROM price_daily WHERE ticker = OLD.ticker)
+                END,
+                highest_price = CASE
+                    WHEN OLD.high < highest_price THEN highest_price
+                    ELSE (SELECT MAX(high) FROM price_daily WHERE ticker = OLD.ticker)
+                END
+            WHERE ticker = OLD.ticker;
+
+            DELETE FROM ticker_stats WHERE ticker = OLD.ticker AND total_days <= 0;
+        END
+    ''')
 
-def insert_price(data):
-    conn = sqlite3.connect('database/taiwan_stock.db')
+    # 第一次建立（或 price_daily 剛搬移過）時，從既有的價格資料算出統計
+    if existed and rebuild:
+        cursor.execute("DELETE FROM ticker_stats")
+    if not existed or rebuild:
+        cursor.execute('''
+            INSERT INTO ticker_stats (
+                ticker, total_days, first_date, last_date,
+                lowest_price, highest_price, sum_close, close_count, total_volume
+            )
+            SELECT ticker, COUNT(*), MIN(date), MAX(date),
+                   MIN(low), MAX(high), TOTAL(close), COUNT(close), SUM(volume)
+            FROM price_daily
+            GROUP BY ticker
+        ''')
+
+
+def create_table():
+    """建立資料庫表格"""
+    os.makedirs('./database', exist_ok=True)
+    # 自行管理交易：sqlite3 預設會讓 DDL 自動 commit，搬移到一半失敗會留下半成品
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    # page_size 只在建立第一張表之前（且切換到 WAL 之前）有效
+    conn.execute("PRAGMA page_size=8192")
+    _apply_pragmas(conn)
     cursor = conn.cursor()
 
-    sql = """
-    INSERT INTO price_daily (
-        date, open, high, low, close, volume, dividends, stock_splits, ticker
-    )
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ON CONFLICT(ticker, date)
-    DO UPDATE SET
-        open = excluded.open,
-        high = excluded.high,
-        low = excluded.low,
-        close = excluded.close,
-        volume = excluded.volume,
-        dividends = excluded.dividends,
-        stock_splits = excluded.stock_splits;
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        _create_price_daily(cursor)
+        migrated = _migrate_price_daily(cursor)
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ticker_categories (
+                ticker TEXT,
+                category_id INTEGER,
+                PRIMARY KEY (ticker, category_id),
+                FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+            )
+        ''')
+
+        # 依分類查股票時直接走這個索引，不必掃描 ticker_categories 全表
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tc_cat_ticker
+            ON ticker_categories (category_id, ticker)
+        ''')
+
+        _create_ticker_stats(cursor, rebuild=migrated)
+
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    print("✅ 資料庫初始化完成")
+
+
+def connect_for_bulk_insert():
+    """
+    開啟批次寫入用的連線
+    呼叫端負責 BEGIN / commit / close，並以 conn.cursor() 搭配 insert_price(rows, cursor=cursor) 使用
     """
+    conn = sqlite3.connect(DB_PATH, cached_statements=_CACHED_STATEMENTS)
+    _apply_pragmas(conn)
+    return conn
 
-    data_to_insert = list(data.itertuples(index=False, name=None))
-    cursor.executemany(sql, data_to_insert)
-    conn.commit()
-    conn.close()
+
+def insert_price(rows, cursor=None):
+    """
+    寫入股價資料
+    rows: 可迭代的資料列，欄位順序為
+          (date, open, high, low, close, volume, dividends, stock_splits, ticker)
+    cursor: 既有游標（批次寫入時重複使用），由呼叫端負責 commit；未提供時從連線池取連線並 commit
+    """
+    if cursor is not None:
+        # executemany 直接消耗迭代器，不另建整份 list
+        cursor.executemany(INSERT_PRICE_SQL, rows)
+        return
+
+    with get_conn() as conn:
+        conn.executemany(INSERT_PRICE_SQL, rows)
+        conn.commit()
 
 
 def select_price(ticker):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    try:
-        sql = """
-        SELECT date, open, high, low, close, volume, dividends, stock_splits
-        FROM price_daily
-        WHERE ticker = ?
-        ORDER BY date
-        """
-        df = pd.read_sql_query(sql, conn, params=(ticker,))
-        df['date'] = pd.to_datetime(df['date'])
-        return df
-    finally:
-        conn.close()
+    sql = """
+    SELECT date, open, high, low, close, volume, dividends, stock_splits
+    FROM price_daily
+    WHERE ticker = ?
+    ORDER BY date
+    """
+    with get_conn() as conn:
+        rows = conn.execute(sql, (ticker,)).fetchall()
+
+    # 直接轉成具型別的 numpy 結構陣列，避免 read_sql_query 逐格建立 Python 物件
+    return pd.DataFrame(np.array(rows, dtype=_PRICE_DTYPE))
+
+
+# 沿著 (ticker, date) 主鍵跳躍：每次只找下一個比目前大的 ticker，
+# 每支股票只碰一次索引，不必像 DISTINCT 掃過所有價格資料
+_DISTINCT_TICKERS_SQL = """
+    WITH RECURSIVE t(ticker) AS (
+        SELECT MIN(ticker) FROM price_daily
+        UNION ALL
+        SELECT (SELECT MIN(ticker) FROM price_daily WHERE ticker > t.ticker)
+        FROM t
+        WHERE t.ticker IS NOT NULL
+    )
+    SELECT ticker FROM t WHERE ticker IS NOT NULL ORDER BY ticker
+"""
 
 
 def get_all_tickers():
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT ticker FROM price_daily ORDER BY ticker")
-    tickers = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return tickers
+    with get_conn() as conn:
+        rows = conn.execute(_DISTINCT_TICKERS_SQL).fetchall()
+    return [row[0] for row in rows]
+
+
+def epoch_day_to_str(day):
+    """將 price_daily 的日期（1970-01-01 起算的天數）轉成 'YYYY-MM-DD'"""
+    return (_EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')
 
 
 def get_last_price_date(ticker):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(date) FROM price_daily WHERE ticker = ?", (ticker,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result[0] else None
+    """取得股票最後價格日期（1970-01-01 起算的天數），無資料時回傳 None"""
+    with get_conn() as conn:
+        result = conn.execute("SELECT MAX(date) FROM price_daily WHERE ticker = ?", (ticker,)).fetchone()
+    return result[0]
+
+
+def get_last_price_dates():
+    """一次取得所有股票的最後價格日期，回傳 {ticker: 1970-01-01 起算的天數}"""
+    with get_conn() as conn:
+        rows = conn.execute("SELECT ticker, MAX(date) FROM price_daily GROUP BY ticker").fetchall()
+    return dict(rows)
 
 
 def delete_ticker(ticker):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM price_daily WHERE ticker = ?", (ticker,))
-        price_deleted = cursor.rowcount
-        cursor.execute("DELETE FROM ticker_categories WHERE ticker = ?", (ticker,))
-        category_deleted = cursor.rowcount
-        conn.commit()
-        print(f"🗑️ {ticker} 已刪除 | 股價資料: {price_deleted} 筆, 分類關聯: {category_deleted} 筆")
-        return price_deleted > 0
-    except sqlite3.Error as e:
-        print("❌ 刪除失敗：", e)
-        return False
-    finally:
-        conn.close()
+    with get_conn() as conn:
+        try:
+            # 先刪統計列，刪除價格時觸發器就不必逐筆重算
+            conn.execute("DELETE FROM ticker_stats WHERE ticker = ?", (ticker,))
+            price_deleted = conn.execute("DELETE FROM price_daily WHERE ticker = ?", (ticker,)).rowcount
+            category_deleted = conn.execute("DELETE FROM ticker_categories WHERE ticker = ?", (ticker,)).rowcount
+            conn.commit()
+            print(f"🗑️ {ticker} 已刪除 | 股價資料: {price_deleted} 筆, 分類關聯: {category_deleted} 筆")
+            return price_deleted > 0
+        except sqlite3.Error as e:
+            print("❌ 刪除失敗：", e)
+            return False
 
 
 def get_all_categories():
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM categories ORDER BY name")
-    categories = cursor.fetchall()
-    conn.close()
-    return categories
+    with get_conn() as conn:
+        return conn.execute("SELECT id, name FROM categories ORDER BY name").fetchall()
 
 
-def add_category(name):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT INTO categories (name) VALUES (?)", (name,))
+def add_categories(names):
+    """
+    批次新增分類（單一交易），已存在的名稱會略過
+    回傳實際新增的分類數量
+    """
+    with get_conn() as conn:
+        added = conn.executemany("INSERT OR IGNORE INTO categories (name) VALUES (?)",
+                                 [(name,) for name in names]).rowcount
         conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    return added
+
+
+def add_category(name):
+    return add_categories([name]) == 1
 
 
 def delete_category(category_id):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
-        conn.commit()
-        return True
-    except sqlite3.Error:
-        return False
-    finally:
-        conn.close()
+    with get_conn() as conn:
+        try:
+            conn.execute("DELETE FROM categories WHERE id = ?", (category_id,))
+            conn.commit()
+            return True
+        except sqlite3.Error:
+            return False
+
+
+def assign_tickers_to_categories(pairs):
+    """
+    批次指定股票分類（單一交易）
+    pairs: [(ticker, category_id), ...]
+    """
+    with get_conn() as conn:
+        try:
+            conn.executemany("""
+                INSERT OR IGNORE INTO ticker_categories (ticker, category_id)
+                VALUES (?, ?)
+            """, pairs)
+            conn.commit()
+            return True
+        except sqlite3.Error:
+            return False
 
 
 def assign_ticker_to_category(ticker, category_id):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            INSERT OR IGNORE INTO ticker_categories (ticker, category_id)
-            VALUES (?, ?)
-        """, (ticker, category_id))
-        conn.commit()
-        return True
-    except sqlite3.Error:
-        return False
-    finally:
-        conn.close()
+    return assign_tickers_to_categories([(ticker, category_id)])
+
+
+def remove_tickers_from_categories(pairs):
+    """
+    批次移除股票分類（單一交易）
+    pairs: [(ticker, category_id), ...]
+    """
+    with get_conn() as conn:
+        try:
+            conn.executemany("""
+                DELETE FROM ticker_categories
+                WHERE ticker = ? AND category_id = ?
+            """, pairs)
+            conn.commit()
+            return True
+        except sqlite3.Error:
+            return False
 
 
 def remove_ticker_from_category(ticker, category_id):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            DELETE FROM ticker_categories
-            WHERE ticker = ? AND category_id = ?
-        """, (ticker, category_id))
-        conn.commit()
-        return True
-    except sqlite3.Error:
-        return False
-    finally:
-        conn.close()
+    return remove_tickers_from_categories([(ticker, category_id)])
 
 
 def get_ticker_categories(ticker):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT c.id, c.name
-        FROM categories c
-        JOIN ticker_categories tc ON c.id = tc.category_id
-        WHERE tc.ticker = ?
-        ORDER BY c.name
-    """, (ticker,))
-    categories = cursor.fetchall()
-    conn.close()
-    return categories
+    with get_conn() as conn:
+        return conn.execute("""
+            SELECT c.id, c.name
+            FROM categories c
+            JOIN ticker_categories tc ON c.id = tc.category_id
+            WHERE tc.ticker = ?
+            ORDER BY c.name
+        """, (ticker,)).fetchall()
 
 
 def get_tickers_by_category(category_id=None):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-
-    if category_id is None:
-        cursor.execute("""
-            SELECT DISTINCT pd.ticker, c.name as category_name
-            FROM price_daily pd
-            LEFT JOIN ticker_categories tc ON pd.ticker = tc.ticker
-            LEFT JOIN categories c ON tc.category_id = c.id
-            ORDER BY pd.ticker
-        """)
-    else:
-        cursor.execute("""
-            SELECT DISTINCT pd.ticker
-            FROM price_daily pd
-            JOIN ticker_categories tc ON pd.ticker = tc.ticker
+    with get_conn() as conn:
+        if category_id is None:
+            return conn.execute("""
+                SELECT DISTINCT pd.ticker, c.name as category_name
+                FROM price_daily pd
+                LEFT JOIN ticker_categories tc ON pd.ticker = tc.ticker
+                LEFT JOIN categories c ON tc.category_id = c.id
+                ORDER BY pd.ticker
+            """).fetchall()
+
+        # 只走分類對應表，再用 EXISTS 探測該股票是否有價格資料
+        return conn.execute("""
+            SELECT tc.ticker
+            FROM ticker_categories tc
             WHERE tc.category_id = ?
-            ORDER BY pd.ticker
-        """, (category_id,))
+              AND EXISTS (SELECT 1 FROM price_daily p WHERE p.ticker = tc.ticker)
+            ORDER BY tc.ticker
+        """, (category_id,)).fetchall()
 
-    result = cursor.fetchall()
-    conn.close()
-    return result
 
+_TICKER_STATS_SQL = """
+    SELECT ticker, total_days, first_date, last_date,
+           lowest_price, highest_price, sum_close, close_count, total_volume
+    FROM ticker_stats
+"""
 
-def get_ticker_statistics(ticker):
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_days,
-            MIN(date) as first_date,
-            MAX(date) as last_date,
-            MIN(low) as lowest_price,
-            MAX(high) as highest_price,
-            AVG(close) as avg_price,
-            SUM(volume) as total_volume
-        FROM price_daily
-        WHERE ticker = ?
-    """, (ticker,))
-    result = cursor.fetchone()
-    conn.close()
-    if result:
-        return {
-            'total_days': result[0],
-            'first_date': result[1],
-            'last_date': result[2],
-            'lowest_price': result[3],
-            'highest_price': result[4],
-            'avg_price': result[5],
-            'total_volume': result[6]
-        }
-    return None
 
+def _ticker_stats_row_to_dict(row):
+    return {
+        'total_days': row[1],
+        'first_date': epoch_day_to_str(row[2]),
+        'last_date': epoch_day_to_str(row[3]),
+        'lowest_price': row[4],
+        'highest_price': row[5],
+        # 與 AVG(close) 相同，只以有收盤價的天數為分母
+        'avg_price': row[6] / row[7] if row[7] else None,
+        'total_volume': row[8]
+    }
 
-def get_category_avg_change_5d(category_id=None):
-    """取得分類內所有股票近N日的總漲跌幅平均（預設5日）"""
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
 
-    if category_id is None:
-        cursor.execute("SELECT DISTINCT ticker FROM price_daily")
-    else:
-        cursor.execute("""
-            SELECT DISTINCT ticker FROM ticker_categories
-            WHERE category_id = ?
-        """, (category_id,))
+def get_all_ticker_statistics():
+    """取得所有股票的統計資料，回傳 {ticker: 統計資料}"""
+    with get_conn() as conn:
+        rows = conn.execute(_TICKER_STATS_SQL).fetchall()
+    return {row[0]: _ticker_stats_row_to_dict(row) for row in rows}
 
-    tickers = [row[0] for row in cursor.fetchall()]
-    conn.close()
 
+def get_ticker_statistics(ticker):
+    with get_conn() as conn:
+        row = conn.execute(_TICKER_STATS_SQL + " WHERE ticker = ?", (ticker,)).fetchone()
+    return _ticker_stats_row_to_dict(row) if row else None
+
+
+def get_category_avg_change_5d(category_id=None):
+    """取得分類內所有股票近N日的總漲跌幅平均（預設5日）"""
     changes = []
     days = 5
 
-    for ticker in tickers:
-        conn = sqlite3.connect('database/taiwan_stock.db')
+    with get_conn() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT close FROM price_daily
-            WHERE ticker = ?
-            ORDER BY date DESC
-            LIMIT ?
-        """, (ticker, days))
-        rows = cursor.fetchall()
-        conn.close()
-
-        if len(rows) < days:
-            continue
-
-        closes = [r[0] for r in rows]  # 最新在前
-        change = (closes[0] - closes[-1]) / closes[-1] * 100
-        changes.append(change)
-
-    return sum(changes) / len(changes) if changes else None
 
+        if category_id is None:
+            cursor.execute(_DISTINCT_TICKERS_SQL)
+        else:
+            cursor.execute("""
+                SELECT DISTINCT ticker FROM ticker_categories
+                WHERE category_id = ?
+            """, (category_id,))
 
-def get_all_categories_avg_change(days=5):
-    """
-    取得所有分類的漲跌幅平均，用於比較圖表。
-    days: 計算天數（最新一天 vs N天前）
-    """
-    conn = sqlite3.connect('database/taiwan_stock.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM categories ORDER BY name")
-    categories = cursor.fetchall()
-    conn.close()
-
-    results = []
-    for cat_id, cat_name in categories:
-        conn = sqlite3.connect('database/taiwan_stock.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT DISTINCT ticker FROM ticker_categories
-            WHERE category_id = ?
-        """, (cat_id,))
         tickers = [row[0] for row in cursor.fetchall()]
-        conn.close()
-
-        if not tickers:
-            continue
 
-        changes = []
         for ticker in tickers:
-            conn = sqlite3.connect('database/taiwan_stock.db')
-            cursor = conn.cursor()
             cursor.execute("""
                 SELECT close FROM price_daily
                 WHERE ticker = ?
@@ -340,7 +577,6 @@ def get_all_categories_avg_change(days=5):
                 LIMIT ?
             """, (ticker, days))
             rows = cursor.fetchall()
-            conn.close()
 
             if len(rows) < days:
                 continue
@@ -349,13 +585,54 @@ def get_all_categories_avg_change(days=5):
             change = (closes[0] - closes[-1]) / closes[-1] * 100
             changes.append(change)
 
-        if changes:
-            results.append({
-                'id': cat_id,
-                'name': cat_name,
-                'avg_change': sum(changes) / len(changes),
-                'ticker_count': len(tickers)
-            })
+    return sum(changes) / len(changes) if changes else None
+
+
+def get_all_categories_avg_change(days=5):
+    """
+    取得所有分類的漲跌幅平均，用於比較圖表。
+    days: 計算天數（最新一天 vs N天前）
+    """
+    results = []
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name FROM categories ORDER BY name")
+        categories = cursor.fetchall()
+
+        for cat_id, cat_name in categories:
+            cursor.execute("""
+                SELECT DISTINCT ticker FROM ticker_categories
+                WHERE category_id = ?
+            """, (cat_id,))
+            tickers = [row[0] for row in cursor.fetchall()]
+
+            if not tickers:
+                continue
+
+            changes = []
+            for ticker in tickers:
+                cursor.execute("""
+                    SELECT close FROM price_daily
+                    WHERE ticker = ?
+                    ORDER BY date DESC
+                    LIMIT ?
+                """, (ticker, days))
+                rows = cursor.fetchall()
+
+                if len(rows) < days:
+                    continue
+
+                closes = [r[0] for r in rows]  # 最新在前
+                change = (closes[0] - closes[-1]) / closes[-1] * 100
+                changes.append(change)
+
+            if changes:
+                results.append({
+                    'id': cat_id,
+                    'name': cat_name,
+                    'avg_change': sum(changes) / len(changes),
+                    'ticker_count': len(tickers)
+                })
 
     results.sort(key=lambda x: x['avg_change'], reverse=True)
     return results
\ No newline at end of file
@@ -1,6 +1,103 @@
 import yfinance as yf
 import database as db
-from datetime import datetime, timedelta
+import itertools
+import numpy as np
+import pandas as pd
+
+# yf.download 同時下載的執行緒數量（網路 I/O 為主，執行緒多一些無妨）
+MAX_DOWNLOAD_WORKERS = 16
+
+# 更新時跨股票累積資料列，每滿這個數量才呼叫一次 executemany
+INSERT_BATCH_ROWS = 50000
+
+
+def _price_rows(df, ticker):
+    """
+    將 yfinance 回傳的資料轉成 db.insert_price 使用的資料列
+    直接對取出的 numpy 陣列運算，不建立中間的 DataFrame
+    """
+    # 日期轉成 1970-01-01 起算的天數（以交易所當地日期為準）
+    index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    dates = index.to_numpy().astype('datetime64[D]').astype(np.int32)
+
+    # 數值處理：價格四捨五入到兩位小數，成交量轉整數
+    opens = np.round(df['Open'].to_numpy(), 2)
+    highs = np.round(df['High'].to_numpy(), 2)
+    lows = np.round(df['Low'].to_numpy(), 2)
+    closes = np.round(df['Close'].to_numpy(), 2)
+    # 缺漏的成交量以 0 代替，避免 NaN 轉整數變成極小的無意義值
+    vols = df['Volume'].fillna(0).to_numpy().astype(np.int64, copy=False)
+    divs = np.round(df['Dividends'].to_numpy(), 2)
+    splits = np.round(df['Stock Splits'].to_numpy(), 2)
+
+    # 股票代碼不建成一整欄，同一個字串物件重複綁定即可
+    tickers = itertools.repeat(ticker, len(dates))
+    return zip(dates, opens, highs, lows, closes, vols, divs, splits, tickers)
+
+
+def _download_group(tickers, start_date):
+    """
+    以 yf.download 一次抓取同一起始日的多支股票，回傳 {ticker: DataFrame 或 Exception}
+    start_date 為 None 時抓取完整歷史
+    yfinance 所有請求共用同一個 session 與 cookie/crumb，不會每支股票重新驗證；
+    還原股價的計算也交給 yfinance，因此不直接呼叫 Yahoo chart API
+    """
+    if start_date:
+        data = yf.download(tickers=tickers, start=start_date, group_by='ticker',
+                           threads=MAX_DOWNLOAD_WORKERS, auto_adjust=True, actions=True,
+                           progress=False)
+    else:
+        data = yf.download(tickers=tickers, period="max", group_by='ticker',
+                           threads=MAX_DOWNLOAD_WORKERS, auto_adjust=True, actions=True,
+                           progress=False)
+
+    if data is None:
+        data = pd.DataFrame()
+
+    # 舊版 yfinance 只抓一支股票時回傳單層欄位，補成 (ticker, 欄位) 的兩層結構
+    if len(tickers) == 1 and not data.empty and not isinstance(data.columns, pd.MultiIndex):
+        data = pd.concat({tickers[0]: data}, axis=1)
+
+    # 整組都沒有新資料（假日、同一天重複更新），每支股票都是已是最新
+    if data.empty:
+        return {ticker: pd.DataFrame() for ticker in tickers}
+
+    results = {}
+    for ticker in tickers:
+        if ticker not in data.columns.get_level_values(0):
+            # 有下載結果卻沒有這支股票，視為抓取失敗而不是已是最新
+            results[ticker] = LookupError(f"下載結果中沒有 {ticker}")
+            continue
+
+        # 多支股票的日期取聯集，去掉該股票沒有交易的日期
+        df = data[ticker].dropna(subset=['Close'])
+        if df.empty:
+            results[ticker] = df
+            continue
+
+        df[['Dividends', 'Stock Splits']] = df[['Dividends', 'Stock Splits']].fillna(0)
+        results[ticker] = df
+    return results
+
+
+def _flush_rows(cursor, rows, tickers):
+    """
+    寫入累積的資料列，成功回傳 True
+    每批包在 SAVEPOINT 裡，失敗時整批撤回，不會留下寫到一半的資料
+    """
+    cursor.execute("SAVEPOINT batch")
+    try:
+        db.insert_price(rows, cursor=cursor)
+    except Exception as e:
+        cursor.execute("ROLLBACK TO batch")
+        cursor.execute("RELEASE batch")
+        print(f"❌ 批次寫入失敗（{', '.join(tickers)}）：{e}")
+        return False
+
+    cursor.execute("RELEASE batch")
+    for ticker in tickers:
+        print(f"✅ {ticker} 已寫入")
+    return True
 
 
 def insert_ticker(ticker, silent=False):
@@ -20,36 +117,9 @@ def insert_ticker(ticker, silent=False):
             if not silent:
                 print(f"⚠️ {ticker} 查無資料")
             return False
-            
-        df = df.reset_index()
-        df['ticker'] = ticker
-        
-        # 重新命名欄位
-        df = df.rename(columns={
-            'Date': 'date',
-            'Open': 'open',
-            'High': 'high',
-            'Low': 'low',
-            'Close': 'close',
-            'Volume': 'volume',
-            'Dividends': 'dividends',
-            'Stock Splits': 'stock_splits'
-        })
-        
-        # 選擇需要的欄位
-        df = df[['date', 'open', 'high', 'low', 'close',
-                 'volume', 'dividends', 'stock_splits', 'ticker']]
-        
-        # 格式化日期
-        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-        
-        # 數值處理：價格四捨五入到兩位小數，成交量轉整數
-        price_cols = ['open', 'high', 'low', 'close', 'dividends', 'stock_splits']
-        df[price_cols] = df[price_cols].round(2)
-        df['volume'] = df['volume'].astype(int)
         
         # 存入資料庫
-        db.insert_price(df)
+        db.insert_price(_price_rows(df, ticker))
         if not silent:
             print(f"✅ {ticker} 新增成功，共 {len(df)} 筆歷史資料")
         return True
@@ -72,72 +142,89 @@ def update_all_ticker():
     success_count = 0
     fail_count = 0
     already_updated = 0
-    
-    for i, ticker in enumerate(tickers, 1):
+
+    # 一次查出所有股票的最後更新日期
+    last_dates = db.get_last_price_dates()
+
+    # 依起始日分組，同組股票用一次 yf.download 批次抓取
+    groups = {}
+    for ticker in tickers:
+        last_date = last_dates.get(ticker)
+        if last_date is not None:
+            # 從最後日期的隔天開始抓
+            start_date = db.epoch_day_to_str(last_date + 1)
+        else:
+            # 沒有歷史資料，抓全部
+            start_date = None
+        groups.setdefault(start_date, []).append(ticker)
+
+    # yf.download 內部使用模組層級的共用狀態，各組之間必須依序呼叫
+    downloaded = {}
+    for start_date, group in groups.items():
         try:
-            print(f"[{i}/{len(tickers)}] 🔄 更新 {ticker}...", end=" ")
-            
-            # 取得最後更新日期
-            last_date = db.get_last_price_date(ticker)
-            
-            ticker_obj = yf.Ticker(ticker)
-            
-            # 如果有最後日期，只抓取之後的資料
-            if last_date:
-                # 從最後日期的隔天開始抓
-                start_date = (datetime.strptime(last_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
-                df = ticker_obj.history(start=start_date)
-                
+            downloaded.update(_download_group(group, start_date))
+        except Exception as e:
+            for ticker in group:
+                downloaded[ticker] = e
+
+    # 所有股票共用一個連線與交易，最後只 commit 一次
+    conn = db.connect_for_bulk_insert()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # 所有股票共用同一個游標與預先編譯好的 INSERT 語句
+        cursor = conn.cursor()
+        pending_rows = []
+        pending_tickers = []
+        for i, ticker in enumerate(tickers, 1):
+            try:
+                print(f"[{i}/{len(tickers)}] 🔄 更新 {ticker}...", end=" ")
+
+                df = downloaded[ticker]
+                if isinstance(df, Exception):
+                    raise df
+
+                if last_dates.get(ticker) is not None:
+                    if df.empty:
+                        print("✓ 已是最新資料")
+                        already_updated += 1
+                        continue
+
+                    print(f"📥 新增 {len(df)} 筆資料", end=" ")
+                else:
+                    print(f"📥 抓取 {len(df)} 筆資料（完整歷史）", end=" ")
+
                 if df.empty:
-                    print("✓ 已是最新資料")
-                    already_updated += 1
+                    print("⚠️ 無可用資料")
+                    fail_count += 1
                     continue
-                    
-                print(f"📥 新增 {len(df)} 筆資料", end=" ")
-            else:
-                # 沒有歷史資料，抓全部
-                df = ticker_obj.history(period="max")
-                print(f"📥 抓取 {len(df)} 筆資料（完整歷史）", end=" ")
-            
-            if df.empty:
-                print("⚠️ 無可用資料")
+
+                # 先累積，湊滿一批再寫入資料庫
+                pending_rows.extend(_price_rows(df, ticker))
+                pending_tickers.append(ticker)
+
+                print("⏳ 等待寫入")
+
+            except Exception as e:
+                print(f"❌ 錯誤: {e}")
                 fail_count += 1
-                continue
-
-            # 處理資料格式
-            df = df.reset_index()
-            df['ticker'] = ticker
-
-            df = df.rename(columns={
-                'Date': 'date',
-                'Open': 'open',
-                'High': 'high',
-                'Low': 'low',
-                'Close': 'close',
-                'Volume': 'volume',
-                'Dividends': 'dividends',
-                'Stock Splits': 'stock_splits'
-            })
-
-            df = df[['date', 'open', 'high', 'low', 'close',
-                     'volume', 'dividends', 'stock_splits', 'ticker']]
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-            
-            # 數值處理
-            price_cols = ['open', 'high', 'low', 'close', 'dividends', 'stock_splits']
-            df[price_cols] = df[price_cols].round(2)
-            df['volume'] = df['volume'].astype(int)
-
-            # 存入資料庫
-            db.insert_price(df)
-            
-            print("✅")
-            success_count += 1
-            
-        except Exception as e:
-            print(f"❌ 錯誤: {e}")
-            fail_count += 1
-    
+
+            if len(pending_rows) >= INSERT_BATCH_ROWS:
+                if _flush_rows(cursor, pending_rows, pending_tickers):
+                    success_count += len(pending_tickers)
+                else:
+                    fail_count += len(pending_tickers)
+                pending_rows = []
+                pending_tickers = []
+
+        if pending_rows:
+            if _flush_rows(cursor, pending_rows, pending_tickers):
+                success_count += len(pending_tickers)
+            else:
+                fail_count += len(pending_tickers)
+        conn.commit()
+    finally:
+        conn.close()
+
     print(f"\n{'='*60}")
     print(f"📊 更新完成統計:")
     print(f"   ✅ 成功更新: {success_count}/{len(tickers)}")
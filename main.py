@@ -130,9 +130,8 @@ class TaiwanStockApp:
             if ticker_code.endswith(('.TW', '.TWO')):
                 final_ticker = ticker_code
                 if download.insert_ticker(final_ticker):
-                    for cat_id, var in category_vars.items():
-                        if var.get():
-                            db.assign_ticker_to_category(final_ticker, cat_id)
+                    db.assign_tickers_to_categories(
+                        [(final_ticker, cat_id) for cat_id, var in category_vars.items() if var.get()])
                     label_result.config(text=f"{final_ticker} 已新增完成！", fg="green")
                     entry.delete(0, tk.END)
                 else:
@@ -144,9 +143,8 @@ class TaiwanStockApp:
 
                 if download.insert_ticker(final_ticker, silent=True):
                     print(f"✅ {final_ticker} 新增成功（上市股票）")
-                    for cat_id, var in category_vars.items():
-                        if var.get():
-                            db.assign_ticker_to_category(final_ticker, cat_id)
+                    db.assign_tickers_to_categories(
+                        [(final_ticker, cat_id) for cat_id, var in category_vars.items() if var.get()])
                     label_result.config(text=f"{final_ticker} 已新增完成！", fg="green")
                     entry.delete(0, tk.END)
                 else:
@@ -156,9 +154,8 @@ class TaiwanStockApp:
 
                     if download.insert_ticker(final_ticker):
                         print(f"✅ {final_ticker} 新增成功（上櫃股票）")
-                        for cat_id, var in category_vars.items():
-                            if var.get():
-                                db.assign_ticker_to_category(final_ticker, cat_id)
+                        db.assign_tickers_to_categories(
+                            [(final_ticker, cat_id) for cat_id, var in category_vars.items() if var.get()])
                         label_result.config(text=f"{final_ticker} 已新增完成！", fg="green")
                         entry.delete(0, tk.END)
                     else:
@@ -396,11 +393,9 @@ class TaiwanStockApp:
         cat_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         def save_categories():
-            for cat_id, _ in categories:
-                db.remove_ticker_from_category(ticker, cat_id)
-            for cat_id, var in category_vars.items():
-                if var.get():
-                    db.assign_ticker_to_category(ticker, cat_id)
+            db.remove_tickers_from_categories([(ticker, cat_id) for cat_id, _ in categories])
+            db.assign_tickers_to_categories(
+                [(ticker, cat_id) for cat_id, var in category_vars.items() if var.get()])
             messagebox.showinfo("成功", f"{display_name} 的分類已更新")
             self.back()
 